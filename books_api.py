@@ -8,24 +8,32 @@ from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.oauth2.credentials import Credentials
 import base64
+import hmac
 import json
 
 import os
 import io
+import asyncio
 import sqlite3
 import csv
+import threading
 import traceback
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
 from fastapi import UploadFile, File
 from fastapi import FastAPI, HTTPException, Header
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 # Google Drive client libs
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload, MediaIoBaseUpload, build_http
 from googleapiclient.errors import HttpError
 
 # ---------------------------
@@ -34,10 +42,16 @@ from googleapiclient.errors import HttpError
 API_KEY = os.environ.get("BOOKS_API_KEY")
 if not API_KEY:
     raise RuntimeError("BOOKS_API_KEY environment variable is NOT set! Set it in Railway Variables.")
+# stripped and encoded once; check_key compares against this
+_API_KEY_BYTES = API_KEY.strip().encode()
 
 # file names inside the container (will be transient; we sync to Drive)
 DB_FILE = os.environ.get("BOOKS_DB_FILE", "books.db")
+DB_TIMEOUT = 5.0  # seconds to wait on a locked DB before raising
 BACKUP_CSV = os.environ.get("BOOKS_BACKUP_CSV", "books_backup.csv")
+BACKUP_BATCH_SIZE = 1000  # rows pulled per fetchmany() when exporting CSV
+DRIVE_SYNC_DELAY = 2.0  # seconds; writes landing within this window share one Drive upload
+DRIVE_SYNC_MAX_BACKOFF = 300.0  # seconds; cap on the retry delay after failed Drive uploads
 BOOKS_OWNER_EMAIL = os.environ.get("BOOKS_OWNER_EMAIL")  # your personal Google email
 EBOOKS_FOLDER_ID = os.environ.get("EBOOKS_FOLDER_ID")
 OAUTH_CREDENTIALS_B64 = os.environ.get("OAUTH_CREDENTIALS_B64")
@@ -65,14 +79,14 @@ DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive"]
 # Create credentials and service object (will be used for upload/download of DB)
 try:
     credentials = service_account.Credentials.from_service_account_info(sa_info, scopes=DRIVE_SCOPES)
-    drive_service = build("drive", "v3", credentials=credentials, cache_discovery=False)
+    drive_service = build("drive", "v3", credentials=credentials, cache_discovery=False, static_discovery=True)
 except Exception as e:
     raise RuntimeError("Failed to initialize Google Drive client. Check service account JSON and network.") from e
 
 # ---------------------------
 # FastAPI app
 # ---------------------------
-app = FastAPI(title="Books Log API (Drive-backed)")
+app = FastAPI(title="Books Log API (Drive-backed)", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -81,6 +95,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# compresses larger bodies (e.g. the streamed /backup CSV) for clients sending Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # ---------------------------
 # Models
@@ -102,26 +118,58 @@ class BookOut(BookIn):
 def check_key(x_api_key: Optional[str]):
     if x_api_key is None:
         raise HTTPException(status_code=401, detail="Missing API key")
-    # strip to avoid hidden-space mismatches
-    if x_api_key.strip() != API_KEY.strip():
+    # strip to avoid hidden-space mismatches; constant-time compare so timing doesn't leak the key
+    if not hmac.compare_digest(x_api_key.strip().encode(), _API_KEY_BYTES):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
 # ---------------------------
 # Google Drive helpers (service account for DB)
 # ---------------------------
+# md5Checksum of the Drive copy that the local DB was last downloaded from or uploaded as.
+# Compared against Drive at startup (the local file itself never hashes the same: WAL mode
+# rewrites its header, and uploads are backup-API snapshots rather than the file itself).
+DB_SYNC_MD5_FILE = DB_FILE + ".md5"
+
+def read_synced_md5():
+    try:
+        with open(DB_SYNC_MD5_FILE, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def write_synced_md5(md5):
+    if not md5:
+        return
+    try:
+        with open(DB_SYNC_MD5_FILE, "w", encoding="utf-8") as f:
+            f.write(md5)
+    except OSError as e:
+        print("Failed to record DB checksum (non-fatal):", e)
+
 def download_db_from_drive():
     """
     Download the Google Drive file (GOOGLE_DRIVE_FILE_ID) and save it to DB_FILE.
+    Skipped when the local DB is already in sync with the Drive copy (same md5Checksum).
     If the file does not exist on Drive (404), create an empty DB locally and upload it.
     """
     try:
+        remote_md5 = drive_service.files().get(fileId=GOOGLE_DRIVE_FILE_ID, fields="md5Checksum").execute().get("md5Checksum")
+        if remote_md5 and os.path.exists(DB_FILE) and read_synced_md5() == remote_md5:
+            print("Local DB already matches Drive copy, skipping download")
+            return True
+
         request = drive_service.files().get_media(fileId=GOOGLE_DRIVE_FILE_ID)
+        # stale WAL sidecars from a previous run must not be replayed onto the fresh copy
+        for sidecar in (DB_FILE + "-wal", DB_FILE + "-shm"):
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
         fh = io.FileIO(DB_FILE, mode="wb")
         downloader = MediaIoBaseDownload(fh, request)
         done = False
         while not done:
             status, done = downloader.next_chunk()
         fh.close()
+        write_synced_md5(remote_md5)
         print("Downloaded DB from Drive to", DB_FILE)
         return True
     except HttpError as e:
@@ -142,12 +190,15 @@ def download_db_from_drive():
 
 def upload_db_to_drive():
     """
-    Upload the local DB_FILE to the existing Drive file ID by using files().update.
+    Upload a snapshot of the local DB to the existing Drive file ID by using files().update.
     If update fails because file not found, try create (rare because we were given an ID).
     """
+    snap_path = snapshot_db()
+    # the DB is small: a single multipart request beats a resumable session (init + PUT)
     try:
-        media = MediaFileUpload(DB_FILE, mimetype="application/octet-stream", resumable=True)
-        updated = drive_service.files().update(fileId=GOOGLE_DRIVE_FILE_ID, media_body=media).execute()
+        media = MediaFileUpload(snap_path, mimetype="application/octet-stream", resumable=False)
+        updated = drive_service.files().update(fileId=GOOGLE_DRIVE_FILE_ID, media_body=media, fields="id, md5Checksum").execute()
+        write_synced_md5(updated.get("md5Checksum"))
         print("Uploaded DB to Drive (updated):", updated.get("id"))
         return True
     except HttpError as e:
@@ -156,64 +207,256 @@ def upload_db_to_drive():
         try:
             # attempt to create a new file (this will not replace the original file id)
             file_metadata = {"name": os.path.basename(DB_FILE)}
-            media = MediaFileUpload(DB_FILE, mimetype="application/octet-stream", resumable=True)
+            media = MediaFileUpload(snap_path, mimetype="application/octet-stream", resumable=False)
             created = drive_service.files().create(body=file_metadata, media_body=media, fields="id").execute()
             print("Uploaded DB to Drive (created new file):", created.get("id"))
             return True
         except Exception as ee:
             print("Failed to upload DB to Drive:", ee)
             raise
+    finally:
+        try:
+            os.remove(snap_path)
+        except OSError:
+            pass
+
+def drive_query_escape(value):
+    """Escape a value for use inside a single-quoted string in a Drive files.list query."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+# Drive ids looked up by the first backup and reused afterwards
+_backup_parent: Optional[str] = None
+_backup_file_id: Optional[str] = None
+
+def backup_csv_to_drive():
+    """
+    Write the CSV backup to BACKUP_CSV and upload it into the same Drive folder as books.db,
+    updating the existing backup file if there is one.
+    """
+    global _backup_parent, _backup_file_id
+
+    with open(BACKUP_CSV, "w", newline="", encoding="utf-8") as f:
+        f.writelines(iter_backup_csv())
+
+    media = MediaFileUpload(BACKUP_CSV, mimetype="text/csv", resumable=False)
+
+    # Fast path: we already know which file to overwrite
+    if _backup_file_id is not None:
+        try:
+            drive_service.files().update(fileId=_backup_file_id, media_body=media).execute()
+            print("Uploaded backup CSV to Drive (updated):", _backup_file_id)
+            return True
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            # backup file was removed on Drive; look it up (or recreate it) below
+            print("Cached backup CSV id is gone on Drive, searching again")
+            _backup_file_id = None
+            media = MediaFileUpload(BACKUP_CSV, mimetype="text/csv", resumable=False)
+
+    # Get parent folder of books.db on Google Drive
+    if _backup_parent is None:
+        file_info = drive_service.files().get(fileId=GOOGLE_DRIVE_FILE_ID, fields="parents").execute()
+        parents = file_info.get("parents", None)
+
+        if not parents:
+            raise RuntimeError("Unable to retrieve parent folder of books.db from Drive.")
+
+        _backup_parent = parents[0]
+
+    # Upload backup CSV to SAME folder
+    file_metadata = {
+        "name": BACKUP_CSV,      # same file name
+        "parents": [_backup_parent]
+    }
+
+    # Search if a backup file already exists to update it instead of making duplicates
+    query = f"name = '{drive_query_escape(BACKUP_CSV)}' and '{drive_query_escape(_backup_parent)}' in parents"
+    search = drive_service.files().list(q=query, fields="files(id)", pageSize=1, spaces="drive").execute()
+    existing_files = search.get('files', [])
+
+    if existing_files:
+        _backup_file_id = existing_files[0]['id']
+        drive_service.files().update(fileId=_backup_file_id, media_body=media).execute()
+        print("Uploaded backup CSV to Drive (updated):", _backup_file_id)
+    else:
+        created = drive_service.files().create(body=file_metadata, media_body=media, fields="id").execute()
+        _backup_file_id = created.get("id")
+        print("Uploaded backup CSV to Drive (created):", _backup_file_id)
+    return True
+
+# ---------------------------
+# Background Drive sync (debounced)
+# ---------------------------
+# Blocking Drive client calls run here so they never stall the event loop
+_drive_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="drive")
+
+async def run_drive(fn, *args, **kwargs):
+    """Run a blocking Drive call (e.g. request.execute) on _drive_pool and await its result."""
+    return await asyncio.get_running_loop().run_in_executor(_drive_pool, functools.partial(fn, *args, **kwargs))
+
+_db_dirty = asyncio.Event()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_uploader_task: Optional[asyncio.Task] = None
+
+def mark_db_dirty():
+    """Ask the background uploader to push the DB and CSV backup to Drive. Safe to call from any thread."""
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_db_dirty.set)
+
+# One sync at a time: runs share the DB_FILE + ".snap" and BACKUP_CSV paths on disk
+_sync_lock = threading.Lock()
+
+def sync_to_drive():
+    """Upload the DB and CSV backup. Returns False if the DB upload failed and should be retried."""
+    with _sync_lock:
+        try:
+            upload_db_to_drive()
+        except Exception as e:
+            print("Background DB upload failed:", e)
+            return False
+        try:
+            backup_csv_to_drive()
+        except Exception as e:
+            print("Background CSV backup failed:", e)
+        return True
+
+async def drive_uploader():
+    failures = 0
+    while True:
+        await _db_dirty.wait()
+        # let a burst of writes settle; anything arriving after clear() triggers another round
+        await asyncio.sleep(DRIVE_SYNC_DELAY)
+        _db_dirty.clear()
+        if await run_drive(sync_to_drive):
+            failures = 0
+            continue
+
+        # keep the DB dirty and back off exponentially so a persistent Drive error (403, quota)
+        # doesn't turn into a snapshot + upload attempt every few seconds
+        failures += 1
+        backoff = min(DRIVE_SYNC_DELAY * 2 ** failures, DRIVE_SYNC_MAX_BACKOFF)
+        print(f"Retrying Drive upload in {backoff:.0f}s (attempt {failures + 1})")
+        _db_dirty.set()
+        await asyncio.sleep(backoff)
 
 # ---------------------------
 # SQLite helpers
 # ---------------------------
+def open_conn():
+    """
+    Open a connection to DB_FILE in autocommit mode with the tuned PRAGMAs applied.
+    Multi-statement writes must wrap themselves in an explicit BEGIN / commit().
+    """
+    conn = sqlite3.connect(DB_FILE, timeout=DB_TIMEOUT, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(DB_TIMEOUT * 1000)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")  # ~64 MB page cache
+    return conn
+
+# Long-lived connections shared by every request so the page cache survives between calls.
+# Both are opened lazily (after the startup Drive download has replaced DB_FILE).
+# _conn is the write connection: every use holds _write_lock so transactions never interleave.
+# _read_conn only ever reads; being a separate connection, WAL gives it a committed snapshot
+# and it never sees a writer's half-finished transaction.
+_conn: Optional[sqlite3.Connection] = None
+_read_conn: Optional[sqlite3.Connection] = None
+_write_lock = threading.Lock()
+_read_conn_lock = threading.Lock()
+
+def get_conn():
+    global _conn
+    if _conn is None:
+        _conn = open_conn()
+        # rows are keyed by column name (and still indexable by position)
+        _conn.row_factory = sqlite3.Row
+    return _conn
+
+def get_read_conn():
+    global _read_conn
+    # first use comes from threadpool handlers; the lock stops two of them each opening one
+    with _read_conn_lock:
+        if _read_conn is None:
+            _read_conn = open_conn()
+            _read_conn.row_factory = sqlite3.Row
+        return _read_conn
+
 def init_db_local():
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY,
-            title TEXT,
-            author TEXT,
-            status TEXT,
-            rating TEXT,
-            notes TEXT,
-            file_path TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    with _write_lock:
+        get_conn().execute("""
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY,
+                title TEXT,
+                author TEXT,
+                status TEXT,
+                rating TEXT,
+                notes TEXT,
+                file_path TEXT
+            )
+        """)
+        get_conn().execute("CREATE INDEX IF NOT EXISTS idx_books_author ON books(author)")
+
+def snapshot_db():
+    """
+    Copy a consistent snapshot of the live DB (WAL contents included) to DB_FILE + ".snap"
+    with SQLite's online backup API and return its path. Holding _write_lock keeps a
+    half-finished transaction on the shared connection out of the copy.
+    """
+    snap_path = DB_FILE + ".snap"
+    dst = sqlite3.connect(snap_path)
+    try:
+        with _write_lock:
+            get_conn().backup(dst)
+    finally:
+        dst.close()
+    return snap_path
 
 def fetch_all_books_local():
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("SELECT id, title, author, status, rating, notes, file_path FROM books ORDER BY id")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
-
-def insert_book_local_with_id(book_id, title, author, status, rating, notes, file_path):
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO books (id, title, author, status, rating, notes, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (book_id, title, author, status, rating, notes, file_path))
-    conn.commit()
-    conn.close()
-
-def get_next_id_local():
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("SELECT MAX(id) FROM books")
-    row = cur.fetchone()
-    conn.close()
-    maxid = row[0] if row and row[0] is not None else 0
-    return maxid + 1
+    return get_read_conn().execute("SELECT id, title, author, status, rating, notes, file_path FROM books ORDER BY id").fetchall()
+
+def insert_book_local(title, author, status, rating, notes, file_path):
+    """Insert a book and return the id SQLite assigned to it (max id + 1 for an INTEGER PRIMARY KEY)."""
+    with _write_lock:
+        cur = get_conn().execute("INSERT INTO books (title, author, status, rating, notes, file_path) VALUES (?, ?, ?, ?, ?, ?)",
+                                 (title, author, status, rating, notes, file_path))
+        return cur.lastrowid
+
+def iter_backup_csv():
+    """
+    Yield the books table as CSV text, one fetchmany() batch at a time,
+    so an export never holds more than BACKUP_BATCH_SIZE rows in memory.
+    The export reads through its own connection, so a slow download sees a single
+    committed snapshot and never keeps a statement open on the shared connections.
+    """
+    # no row_factory: plain tuples go straight into csv.writer without sqlite3.Row
+    conn = open_conn()
+    try:
+        cur = conn.execute("SELECT id, title, author, status, rating, notes, file_path FROM books ORDER BY id")
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow([column[0] for column in cur.description])
+        yield buf.getvalue()
+
+        while True:
+            rows = cur.fetchmany(BACKUP_BATCH_SIZE)
+            if not rows:
+                break
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(rows)
+            yield buf.getvalue()
+    finally:
+        # also runs when the client disconnects mid-download and the generator is closed
+        conn.close()
 
 # ---------------------------
 # Startup: download DB (or create & upload)
 # ---------------------------
 @app.on_event("startup")
 def startup_event():
+    global _loop, _uploader_task
     # Attempt to download DB from Drive; create & upload if missing
     try:
         download_db_from_drive()
@@ -222,9 +465,36 @@ def startup_event():
         traceback.print_exc()
         # As a fallback, ensure a local DB exists
         init_db_local()
-    # Ensure local DB has table
+    # Ensure local DB has table (this also switches the file to WAL so -wal/-shm exist up front)
     init_db_local()
 
+    _loop = asyncio.get_running_loop()
+    _uploader_task = _loop.create_task(drive_uploader())
+
+@app.on_event("shutdown")
+def shutdown_event():
+    global _conn, _read_conn
+    if _uploader_task is not None:
+        _uploader_task.cancel()
+    # don't lose writes that were still waiting for the debounce window;
+    # sync_to_drive waits on _sync_lock for any upload still running on _drive_pool
+    if _db_dirty.is_set():
+        _db_dirty.clear()
+        sync_to_drive()
+    _drive_pool.shutdown(wait=True)
+
+    with _read_conn_lock:
+        if _read_conn is not None:
+            _read_conn.close()
+            _read_conn = None
+
+    if _conn is not None:
+        # refresh planner statistics where SQLite thinks they are stale, then release the file
+        with _write_lock:
+            _conn.execute("PRAGMA optimize")
+            _conn.close()
+            _conn = None
+
 # ---------------------------
 # API endpoints
 # ---------------------------
@@ -232,22 +502,18 @@ def startup_event():
 def get_books(x_api_key: Optional[str] = Header(None)):
     check_key(x_api_key)
     rows = fetch_all_books_local()
-    return [BookOut(id=r[0], title=r[1], author=r[2], status=r[3], rating=r[4], notes=r[5], file_path=r[6]) for r in rows]
+    # Rows come straight from our own table, so skip per-row BookOut validation and FastAPI's
+    # response_model re-validation by returning the response directly (response_model still documents it)
+    return ORJSONResponse([dict(r) for r in rows])
 
 @app.post("/books", response_model=BookOut)
 def add_book(b: BookIn, x_api_key: Optional[str] = Header(None)):
     check_key(x_api_key)
 
-    new_id = get_next_id_local()
-    insert_book_local_with_id(new_id, b.title, b.author, b.status, b.rating, b.notes, b.file_path)
+    new_id = insert_book_local(b.title, b.author, b.status, b.rating, b.notes, b.file_path)
 
-    try:
-        upload_db_to_drive()
-    except Exception as e:
-        print("Upload after add failed:", e)
-
-    # 🔥 NEW — auto backup CSV
-    backup(x_api_key)
+    # Drive upload + CSV backup run in the background (see drive_uploader)
+    mark_db_dirty()
 
     return BookOut(id=new_id, **b.dict())
 
@@ -256,92 +522,85 @@ def add_book(b: BookIn, x_api_key: Optional[str] = Header(None)):
 def update_book(book_id: int, b: BookIn, x_api_key: Optional[str] = Header(None)):
     check_key(x_api_key)
 
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
+    with _write_lock:
+        cur = get_conn().execute(
+            "UPDATE books SET title=?, author=?, status=?, rating=?, notes=?, file_path=? WHERE id=?",
+            (b.title, b.author, b.status, b.rating, b.notes, b.file_path, book_id)
+        )
 
-    cur.execute("SELECT id FROM books WHERE id=?", (book_id,))
-    if cur.fetchone() is None:
-        conn.close()
+    # no row matched -> the book doesn't exist
+    if cur.rowcount == 0:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    cur.execute(
-        "UPDATE books SET title=?, author=?, status=?, rating=?, notes=?, file_path=? WHERE id=?",
-        (b.title, b.author, b.status, b.rating, b.notes, b.file_path, book_id)
-    )
-    conn.commit()
-    conn.close()
-
-    try:
-        upload_db_to_drive()
-    except Exception as e:
-        print("Upload after update failed:", e)
-
-    # 🔥 NEW — auto backup CSV
-    backup(x_api_key)
+    # Drive upload + CSV backup run in the background (see drive_uploader)
+    mark_db_dirty()
 
     return BookOut(id=book_id, **b.dict())
 
 
+# OAuth Drive client is built on first use and then reused (see get_oauth_drive_service)
+_oauth_drive = None
+_oauth_creds: Optional[Credentials] = None
+_oauth_lock = threading.Lock()
+
 def get_oauth_drive_service():
-    """Return Google Drive client authenticated as YOUR Gmail using OAuth."""
+    """Return Google Drive client authenticated as YOUR Gmail using OAuth (built once, then cached)."""
+    global _oauth_drive, _oauth_creds
     if not OAUTH_CREDENTIALS_B64:
         raise HTTPException(500, "OAuth credentials missing")
 
-    # Decode credentials.json
-    cred_data = json.loads(base64.b64decode(OAUTH_CREDENTIALS_B64))
+    with _oauth_lock:
+        if _oauth_drive is None:
+            # Load token if it exists
+            token_data = None
+            if OAUTH_TOKEN_B64:
+                token_data = json.loads(base64.b64decode(OAUTH_TOKEN_B64))
 
-    # Load token if it exists
-    token_data = None
-    if OAUTH_TOKEN_B64:
-        token_data = json.loads(base64.b64decode(OAUTH_TOKEN_B64))
+            if not token_data:
+                raise HTTPException(500, "OAuth token missing. You must authorize first.")
 
-    creds = None
-    if token_data:
-        creds = Credentials.from_authorized_user_info(token_data, SCOPES)
-    else:
-        raise HTTPException(500, "OAuth token missing. You must authorize first.")
+            _oauth_creds = Credentials.from_authorized_user_info(token_data, SCOPES)
+            # static discovery: use the doc bundled with the client library instead of fetching it
+            _oauth_drive = build("drive", "v3", credentials=_oauth_creds, cache_discovery=False, static_discovery=True)
 
-    # Refresh token if needed
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
+        # Refresh token if needed
+        if _oauth_creds.expired and _oauth_creds.refresh_token:
+            _oauth_creds.refresh(Request())
 
-    return build("drive", "v3", credentials=creds)
+        return _oauth_drive
+
+def new_oauth_http():
+    """
+    Fresh authorized transport for one request's calls on the cached OAuth client.
+    httplib2.Http is not thread-safe, so concurrent uploads must not share the client's own.
+    build_http() keeps the client library's socket timeout and stops treating Drive's
+    "308 Resume Incomplete" as a redirect, which resumable uploads rely on.
+    """
+    return AuthorizedHttp(_oauth_creds, http=build_http())
 
 
 @app.delete("/books/{book_id}")
 def delete_book(book_id: int, x_api_key: Optional[str] = Header(None)):
     check_key(x_api_key)
 
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-
-    cur.execute("DELETE FROM books WHERE id=?", (book_id,))
-    conn.commit()
-
-    cur.execute("SELECT title, author, status, rating, notes, file_path FROM books ORDER BY id")
-    rows = cur.fetchall()
-
-    cur.execute("DELETE FROM books")
-    conn.commit()
-
-    new_id = 1
-    for r in rows:
-        cur.execute(
-            "INSERT INTO books (id, title, author, status, rating, notes, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (new_id, r[0], r[1], r[2], r[3], r[4], r[5])
-        )
-        new_id += 1
-
-    conn.commit()
-    conn.close()
-
-    try:
-        upload_db_to_drive()
-    except Exception as e:
-        print("Upload after delete failed:", e)
-
-    # 🔥 NEW — auto backup CSV
-    backup(x_api_key)
+    conn = get_conn()
+    # `with conn` commits on success and rolls back on error, so the shared connection is never left mid-transaction
+    with _write_lock, conn:
+        conn.execute("BEGIN")
+        deleted = conn.execute("DELETE FROM books WHERE id=?", (book_id,)).rowcount
+        if deleted:
+            # Renumber in place: every later id moves down by one. The shift parks those rows
+            # above the current max id first, so no row ever lands on an id that is still taken,
+            # whatever order SQLite visits rows in (and whatever ids already exist, even <= 0).
+            max_id = conn.execute("SELECT MAX(id) FROM books").fetchone()[0]
+            if max_id is not None and max_id > book_id:
+                offset = max_id - book_id
+                conn.execute("UPDATE books SET id = id + ? WHERE id > ?", (offset, book_id))
+                conn.execute("UPDATE books SET id = id - ? WHERE id > ?", (offset + 1, max_id))
+
+    if deleted:
+        # Drive upload + CSV backup run in the background (see drive_uploader)
+        mark_db_dirty()
 
     return {"detail": "deleted_and_renumbered"}
 
@@ -351,35 +610,23 @@ def save_all(payload: List[BookOut], x_api_key: Optional[str] = Header(None)):
     check_key(x_api_key)
 
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM books")
-
-        new_id = 1
-        for item in payload:
-            cur.execute(
+        # ids are reassigned 1..N in payload order
+        rows = [
+            (new_id, item.title, item.author, item.status, item.rating, item.notes, item.file_path)
+            for new_id, item in enumerate(payload, start=1)
+        ]
+
+        conn = get_conn()
+        with _write_lock, conn:
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM books")
+            conn.executemany(
                 "INSERT INTO books (id, title, author, status, rating, notes, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (new_id,
-                 item.get("title", ""),
-                 item.get("author", ""),
-                 item.get("status", ""),
-                 item.get("rating", ""),
-                 item.get("notes", ""),
-                 item.get("file_path", "")
-                )
+                rows
             )
-            new_id += 1
-
-        conn.commit()
-        conn.close()
-
-        try:
-            upload_db_to_drive()
-        except Exception as e:
-            print("Upload after save_all failed:", e)
 
-        # 🔥 NEW — auto backup CSV
-        backup(x_api_key)
+        # Drive upload + CSV backup run in the background (see drive_uploader)
+        mark_db_dirty()
 
         return {"detail": "saved"}
 
@@ -478,19 +725,11 @@ async def upload_ebook(
             detail="EBOOKS_FOLDER_ID not configured on the server."
         )
 
-    # 1. Save incoming file to temporary storage
-    temp_dir = "/tmp"
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_path = os.path.join(temp_dir, file.filename)
-
     try:
-        contents = await file.read()
-        with open(temp_path, "wb") as f:
-            f.write(contents)
-
-        # 2. Build OAuth drive service (acts as your Gmail)
+        # 1. Build OAuth drive service (acts as your Gmail)
         try:
-            drive = get_oauth_drive_service()
+            drive = await run_drive(get_oauth_drive_service)
+            http = new_oauth_http()
         except HTTPException as he:
             # pass through helpful error
             raise he
@@ -498,21 +737,29 @@ async def upload_ebook(
             traceback.print_exc()
             raise HTTPException(status_code=500, detail=f"Failed to initialize OAuth Drive service: {str(e)}")
 
-        # 3. Metadata for the Drive file (use the eBooks folder)
+        # 2. Metadata for the Drive file (use the eBooks folder)
         file_metadata = {
             "name": file.filename,
             "parents": [EBOOKS_FOLDER_ID]
         }
 
-        media = MediaFileUpload(temp_path, resumable=True)
+        # Stream straight from the upload's spooled temp file in 8 MB chunks
+        # instead of reading the whole ebook into memory and copying it to /tmp
+        file.file.seek(0)
+        media = MediaIoBaseUpload(
+            file.file,
+            mimetype=file.content_type or "application/octet-stream",
+            chunksize=8 * 1024 * 1024,
+            resumable=True
+        )
 
-        # 4. Upload file to Drive inside eBooks folder using OAuth drive client
+        # 3. Upload file to Drive inside eBooks folder using OAuth drive client
         try:
-            created = drive.files().create(
+            created = await run_drive(drive.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields="id, webViewLink, webContentLink"
-            ).execute()
+            ).execute, http=http)
         except HttpError as he:
             traceback.print_exc()
             # surface a clearer message
@@ -522,7 +769,7 @@ async def upload_ebook(
         view_url = created.get("webViewLink")
         download_url = created.get("webContentLink")
 
-        # 5. Share with main Google account (viewer) using OAuth drive client
+        # 4. Share with main Google account (viewer) using OAuth drive client
         if BOOKS_OWNER_EMAIL:
             try:
                 permission_body = {
@@ -530,22 +777,16 @@ async def upload_ebook(
                     "role": "reader",
                     "emailAddress": BOOKS_OWNER_EMAIL
                 }
-                drive.permissions().create(
+                await run_drive(drive.permissions().create(
                     fileId=ebook_id,
                     body=permission_body,
                     sendNotificationEmail=False
-                ).execute()
+                ).execute, http=http)
             except Exception as e:
                 # non-fatal: print and continue
                 print("Failed to set viewer permission for owner email (non-fatal):", e)
 
-        # 6. Cleanup
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-
-        # 7. Return URLs for mobile app / PC
+        # 5. Return URLs for mobile app / PC
         return {
             "id": ebook_id,
             "webViewLink": view_url,
@@ -564,61 +805,11 @@ async def upload_ebook(
 
 @app.get("/backup")
 def backup(x_api_key: Optional[str] = Header(None)):
+    """Stream the books table as a CSV download (gzip-compressed when the client accepts it)."""
     check_key(x_api_key)
 
-    try:
-        # -----------------------------
-        # 1. Read DB into CSV
-        # -----------------------------
-        conn = sqlite3.connect(DB_FILE)
-        cur = conn.cursor()
-        cur.execute("SELECT id, title, author, status, rating, notes, file_path FROM books")
-        rows = cur.fetchall()
-        col_names = [column[0] for column in cur.description]
-        conn.close()
-
-        # Write CSV locally
-        with open(BACKUP_CSV, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(col_names)
-            writer.writerows(rows)
-
-        # -----------------------------
-        # 2. Get parent folder of books.db on Google Drive
-        # -----------------------------
-        file_info = drive_service.files().get(fileId=GOOGLE_DRIVE_FILE_ID, fields="parents").execute()
-        parents = file_info.get("parents", None)
-
-        if not parents:
-            raise HTTPException(status_code=500, detail="Unable to retrieve parent folder of books.db from Drive.")
-
-        parent_folder_id = parents[0]
-
-        # -----------------------------
-        # 3. Upload backup CSV to SAME folder
-        # -----------------------------
-        file_metadata = {
-            "name": BACKUP_CSV,      # same file name
-            "parents": [parent_folder_id]
-        }
-
-        media = MediaFileUpload(BACKUP_CSV, mimetype="text/csv", resumable=True)
-
-        # Search if a backup file already exists to update it instead of making duplicates
-        query = f"name = '{BACKUP_CSV}' and '{parent_folder_id}' in parents"
-        search = drive_service.files().list(q=query, fields="files(id)").execute()
-        existing_files = search.get('files', [])
-
-        if existing_files:
-            backup_id = existing_files[0]['id']
-            drive_service.files().update(fileId=backup_id, media_body=media).execute()
-            action = "updated"
-        else:
-            created = drive_service.files().create(body=file_metadata, media_body=media, fields="id").execute()
-            action = "created"
-
-        return {"detail": f"backup_{action}_in_drive"}
-
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Backup failed: {str(e)}")
+    return StreamingResponse(
+        iter_backup_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{os.path.basename(BACKUP_CSV)}"'}
+    )